@@ -1,8 +1,17 @@
 import os
+import copy
+import json
+import time
+import asyncio
+import hashlib
+import weakref
+import threading
+import simdjson
+from collections import OrderedDict
 from dotenv import load_dotenv
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Callable, List, Optional, Set, Tuple
 from naptha_sdk.modules.kb import KnowledgeBase
-from naptha_sdk.schemas import AgentRunInput, AgentDeployment, KBRunInput
+from naptha_sdk.schemas import AgentRunInput, AgentDeployment, KBDeployment, KBRunInput
 from naptha_sdk.user import sign_consumer_id
 from naptha_sdk.utils import get_logger
 from knowledge_base_agent.schemas import (
@@ -15,18 +24,333 @@ load_dotenv()
 
 logger = get_logger(__name__)
 
+# Not required when the module runs on a node, so read without failing at import
+PRIVATE_KEY = os.getenv("PRIVATE_KEY")
+NODE_URL = os.getenv("NODE_URL")
+
+QUERY_CACHE_SIZE = 1000
+QUERY_CACHE_TTL = 300
+STORE_MAX_BATCH = 32
+STORE_MAX_DELAY_MS = 10
+STORE_IDLE_TIMEOUT = 60
+
+# How a KB module reports a func_name it doesn't implement
+UNKNOWN_FUNCTION_ERRORS = ("unknown function", "invalid function name")
+
+# Fields of an ingest_knowledge_batch run that describe the whole batch rather than one store
+BATCH_RUN_FIELDS = ("id", "inputs", "results")
+
+# A simdjson parser holds the buffer of the document it last parsed, so each thread needs its own
+_json_parsers = threading.local()
+
+def extract_search_data(raw: str) -> str:
+    """ Pull the `data` value out of a nested KB search response as JSON, or "" when it is empty
+
+    Arrays and objects come back minified without being materialized, so unlike json.dumps they have no
+    spaces after separators and keep non-ASCII characters as is.
+    """
+
+    parser = getattr(_json_parsers, "parser", None)
+    if parser is None:
+        parser = _json_parsers.parser = simdjson.Parser()
+
+    # The outer document is released before the parser is reused for the inner one
+    inner = parser.parse(raw).at_pointer("/results/0")
+    data = parser.parse(inner).at_pointer("/data")
+    if not data:
+        return ""
+    if isinstance(data, (simdjson.Array, simdjson.Object)):
+        return data.mini.decode()
+    return json.dumps(data)
+
+class QueryCache:
+    """ Bounded LRU cache with TTL for knowledge base query results
+
+    Methods are synchronous and never await, so they can't interleave on the event loop and need no lock.
+    """
+
+    def __init__(self, maxsize: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._entries: OrderedDict[str, Tuple[float, Dict[str, Any]]] = OrderedDict()
+
+    @staticmethod
+    def make_key(kb_key: str, query: str, top_k: int, consumer_id: str) -> str:
+        return hashlib.blake2b(f"{kb_key}|{query}|{top_k}|{consumer_id}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        # Deep copy so callers can't mutate nested values such as the results list
+        return copy.deepcopy(entry[1])
+
+    def set(self, key: str, value: Dict[str, Any], generation: int) -> None:
+        # Drop results fetched before a store/clear landed
+        if generation != self.generation:
+            return
+
+        self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+
+class StoreBatcher:
+    """ Coalesces concurrent store requests into a single ingest_knowledge_batch call """
+
+    def __init__(
+        self,
+        market_kb: KnowledgeBase,
+        create_kb_input: Callable[..., KBRunInput],
+        max_batch: int = STORE_MAX_BATCH,
+        max_delay_ms: int = STORE_MAX_DELAY_MS,
+        idle_timeout: float = STORE_IDLE_TIMEOUT,
+        on_exit: Optional[Callable[[], None]] = None
+    ):
+        self.market_kb = market_kb
+        self.create_kb_input = create_kb_input
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.idle_timeout = idle_timeout
+        self.on_exit = on_exit
+        # Cleared once the KB reports ingest_knowledge_batch as unknown or doesn't answer per item
+        self.batch_supported = True
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._loop = asyncio.get_running_loop()
+        self._task = self._loop.create_task(self._worker())
+
+    @property
+    def alive(self) -> bool:
+        return not self._task.done() and self._loop is asyncio.get_running_loop()
+
+    async def submit(self, store_input: StoreInput, signature: str) -> Dict[str, Any]:
+        if self._task.done():
+            raise RuntimeError("Store batcher was closed")
+        future = self._loop.create_future()
+        await self._queue.put((store_input, signature, future))
+        return await future
+
+    async def close(self) -> None:
+        """ Stop the worker and fail any store still waiting on it """
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+        pending = []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        self._fail(pending, RuntimeError("Store batcher was closed"))
+
+    async def _worker(self) -> None:
+        """ Flush batches until the queue has been idle for idle_timeout, then exit """
+
+        batch = []
+        try:
+            while True:
+                try:
+                    batch = [await asyncio.wait_for(self._queue.get(), self.idle_timeout)]
+                except asyncio.TimeoutError:
+                    if self._queue.empty():
+                        return
+                    continue
+                await self._fill(batch)
+
+                try:
+                    await self._flush(batch)
+                except Exception as e:
+                    logger.error(f"Error flushing store batch: {str(e)}")
+                    self._fail(batch, e)
+                batch = []
+        except asyncio.CancelledError:
+            self._fail(batch, RuntimeError("Store batcher was closed"))
+            raise
+        finally:
+            if self.on_exit is not None:
+                self.on_exit()
+
+    async def _fill(self, batch: List[Tuple[StoreInput, str, asyncio.Future]]) -> None:
+        # Let stores issued alongside the first one reach the queue before deciding to wait
+        await asyncio.sleep(0)
+        deadline = self._loop.time() + self.max_delay
+
+        while len(batch) < self.max_batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+
+            # A lone store goes out right away instead of waiting out the batching window
+            timeout = deadline - self._loop.time()
+            if len(batch) == 1 or timeout <= 0:
+                return
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                return
+
+    async def _flush(self, batch: List[Tuple[StoreInput, str, asyncio.Future]]) -> None:
+        if len(batch) == 1 or not self.batch_supported:
+            await self._ingest_each(batch)
+            return
+
+        # Any error besides an unknown function may come after the node applied some or all of the
+        # batch, so it goes back to the callers instead of being replayed item by item
+        result = await self._run(
+            "ingest_knowledge_batch",
+            {"items": [self._payload(store_input) for store_input, _, _ in batch]},
+            batch[0][1]
+        )
+        if result.get("status") == "error" or result.get("error"):
+            error = result.get("error_message") or result.get("message") or "unknown error"
+            if not self._is_unknown_function(error):
+                raise RuntimeError(f"ingest_knowledge_batch failed: {error}")
+
+            logger.warning(f"KB does not support ingest_knowledge_batch, storing items one by one: {error}")
+            self.batch_supported = False
+            await self._ingest_each(batch)
+            return
+
+        results = result.get("results")
+        if not isinstance(results, list) or len(results) != len(batch):
+            logger.warning(
+                f"ingest_knowledge_batch returned {len(results) if isinstance(results, list) else 'no'} "
+                f"results for {len(batch)} items; later stores will be sent one by one"
+            )
+            self.batch_supported = False
+            self._resolve(batch, [self._item_result(result)] * len(batch))
+            return
+
+        self._resolve(batch, [self._item_result(result, [item_result]) for item_result in results])
+
+    async def _ingest_each(self, batch: List[Tuple[StoreInput, str, asyncio.Future]]) -> None:
+        results = await asyncio.gather(
+            *(self._run("ingest_knowledge", self._payload(store_input), signature) for store_input, signature, _ in batch),
+            return_exceptions=True
+        )
+        self._resolve(batch, results)
+
+    async def _run(self, func_name: str, func_input_data: Dict[str, Any], signature: str) -> Dict[str, Any]:
+        kb_run_input = self.create_kb_input(func_name=func_name, func_input_data=func_input_data, signature=signature)
+        return (await self.market_kb.run(kb_run_input)).model_dump(exclude_none=True)
+
+    @staticmethod
+    def _is_unknown_function(error: str) -> bool:
+        error = error.lower()
+        return any(marker in error for marker in UNKNOWN_FUNCTION_ERRORS)
+
+    @staticmethod
+    def _item_result(result: Dict[str, Any], item_results: Optional[List[Any]] = None) -> Dict[str, Any]:
+        # The batch run's id and inputs belong to every item in it, so no caller gets them
+        item_result = {key: value for key, value in result.items() if key not in BATCH_RUN_FIELDS}
+        if item_results is not None:
+            item_result["results"] = item_results
+        return item_result
+
+    @staticmethod
+    def _payload(store_input: StoreInput) -> Dict[str, Any]:
+        return {"content": store_input.content, "metadata": store_input.metadata}
+
+    @staticmethod
+    def _resolve(batch: List[Tuple[StoreInput, str, asyncio.Future]], results: List[Any]) -> None:
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    @staticmethod
+    def _fail(batch: List[Tuple[StoreInput, str, asyncio.Future]], error: BaseException) -> None:
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+# One batcher per (kb deployment, consumer) so batched inputs share a signature.
+# A batcher removes itself once idle, so consumers that stop storing don't keep a worker around.
+_store_batchers: Dict[Tuple[str, str], StoreBatcher] = {}
+
+def _drop_store_batcher(key: Tuple[str, str], batcher: StoreBatcher) -> None:
+    if _store_batchers.get(key) is batcher:
+        del _store_batchers[key]
+
+async def close_store_batchers() -> None:
+    """ Shut down the store batchers running on the current event loop without waiting for them to go idle """
+
+    for key, batcher in list(_store_batchers.items()):
+        if batcher.alive:
+            del _store_batchers[key]
+            await batcher.close()
+
+# KB clients are shared per kb deployment so create() runs once per process instead of once per module run
+_kb_clients: Dict[str, KnowledgeBase] = {}
+_kb_created: Set[str] = set()
+
+# An asyncio.Lock binds to the loop it is first contended on, so keep one per event loop
+_kb_create_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+
+def kb_deployment_key(kb_deployment: KBDeployment) -> str:
+    """ Identify a KB deployment by its name and node, since the same name can point at another node """
+
+    # Runs on every module run, so read a few fields rather than serializing the whole deployment
+    node = kb_deployment.node
+    if isinstance(node, dict):
+        ip, http_port, server_type = node.get("ip"), node.get("http_port"), node.get("server_type")
+    else:
+        ip, http_port, server_type = node.ip, node.http_port, node.server_type
+    return f"{kb_deployment.name}@{server_type}://{ip}:{http_port}"
+
+def _get_kb_create_lock() -> asyncio.Lock:
+    loop = asyncio.get_running_loop()
+    lock = _kb_create_locks.get(loop)
+    if lock is None:
+        lock = _kb_create_locks[loop] = asyncio.Lock()
+    return lock
+
 class KnowledgeBaseAgent:
     """ A knowledge base agent that interfaces with Market_kb through naptha-sdk """
 
+    # Shared across instances since an agent is created per module run
+    _query_cache = QueryCache()
+
     def __init__(self, deployment: AgentDeployment, consumer_id: str):
         self.deployment = deployment
         self.consumer_id = consumer_id
-        self.market_kb = KnowledgeBase()
+        self._kb_key = kb_deployment_key(deployment.kb_deployments[0])
+        self.market_kb = _kb_clients.get(self._kb_key)
+        if self.market_kb is None:
+            self.market_kb = _kb_clients[self._kb_key] = KnowledgeBase()
+
+    async def _ensure_created(self) -> None:
+        """ Create the KB deployment once per process, even with concurrent callers """
+
+        if self._kb_key in _kb_created:
+            return
+        async with _get_kb_create_lock():
+            if self._kb_key not in _kb_created:
+                await self.market_kb.create(self.deployment.kb_deployments[0])
+                _kb_created.add(self._kb_key)
     
     def _create_kb_input(self, func_name: str, signature: str, func_input_data: Optional[Dict[str, Any]] = None) -> KBRunInput:
         """ Helper method to create KBRunInput with proper signature """
 
-        return KBRunInput(
+        # Every field comes from the already validated run, so skip validating the deployment again
+        return KBRunInput.model_construct(
             consumer_id=self.consumer_id,
             inputs={
                 "func_name": func_name,
@@ -35,20 +359,30 @@ class KnowledgeBaseAgent:
             deployment=self.deployment.kb_deployments[0],
             signature=signature
         )
+
+    def _get_store_batcher(self) -> StoreBatcher:
+        """ Return the running store batcher for this deployment and consumer """
+
+        key = (self._kb_key, self.consumer_id)
+        batcher = _store_batchers.get(key)
+        if batcher is None or not batcher.alive:
+            batcher = _store_batchers[key] = StoreBatcher(
+                self.market_kb,
+                self._create_kb_input,
+                on_exit=lambda: _drop_store_batcher(key, batcher)
+            )
+        return batcher
     
     async def store(self, model_run: Dict[str, Any]) -> Dict[str, Any]:
         """ Store knowledge in the market knowledge base """
 
         try:
-            store_input = StoreInput(**model_run.inputs.func_input_data)
-            kb_run_input = self._create_kb_input(
-                func_name="ingest_knowledge",
-                func_input_data=store_input.model_dump(),
-                signature=model_run.signature
-            )
-            result = await self.market_kb.run(kb_run_input)
+            store_input = StoreInput.model_validate(model_run.inputs.func_input_data)
+            await self._ensure_created()
+            result = await self._get_store_batcher().submit(store_input, model_run.signature)
+            self._query_cache.clear()
 
-            return result.model_dump()
+            return result
         except Exception as e:
             logger.error(f"Error storing knowledge: {str(e)}")
             return {"status": "error", "message": str(e)}
@@ -57,8 +391,15 @@ class KnowledgeBaseAgent:
         """ Query the knowledge base """
 
         try:
-            query_input = QueryInput(**model_run.inputs.func_input_data)
+            query_input = QueryInput.model_validate(model_run.inputs.func_input_data)
             logger.info(f"Querying KB with: {query_input.query}")
+
+            cache_key = self._query_cache.make_key(self._kb_key, query_input.query, query_input.top_k, self.consumer_id)
+            cached = self._query_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Query cache hit (hits={self._query_cache.hits}, misses={self._query_cache.misses})")
+                return cached
+            generation = self._query_cache.generation
             
             kb_query_data = {
                 "query": query_input.query,
@@ -72,28 +413,35 @@ class KnowledgeBaseAgent:
                 signature=model_run.signature
             )
 
-            await self.market_kb.create(self.deployment.kb_deployments[0])
+            await self._ensure_created()
             kb_response = await self.market_kb.run(kb_run_input)
-            
-            if hasattr(kb_response, "model_dump"):
-                response_data = kb_response.model_dump()
-            else:
+
+            # Read the few fields we need instead of dumping the whole run (inputs, deployment, ...)
+            if isinstance(kb_response, dict):
                 response_data = kb_response
+            else:
+                response_data = {
+                    field: getattr(kb_response, field)
+                    for field in ("status", "results", "message")
+                    if getattr(kb_response, field, None) is not None
+                }
 
             if response_data.get("status") == "completed" and "results" in response_data:
-                results = json.loads(response_data["results"][0])["results"]
-                data = json.loads(results[0])['data']
+                data = extract_search_data(response_data["results"][0])
                 if not data:
-                    return {
+                    result = {
                         "status": "success", 
                         "message": "No relevant information found for your query.",
                         "results": []
                     }
-                    
-                return {
-                    "status": "success",
-                    "results": json.dumps(data)
-                }
+                else:
+                    result = {
+                        "status": "success",
+                        "results": data
+                    }
+
+                self._query_cache.set(cache_key, result, generation)
+                return result
            
             else:
                 return {
@@ -115,58 +463,71 @@ class KnowledgeBaseAgent:
 
         try:
             kb_run_input = self._create_kb_input(func_name="clear", signature=model_run.signature)
+            await self._ensure_created()
             result = await self.market_kb.run(kb_run_input)
-            return result.model_dump()
+            self._query_cache.clear()
+            return result.model_dump(exclude_none=True)
         except Exception as e:
             logger.error(f"Error clearing knowledge base: {str(e)}")
             return {"status": "error", "message": str(e)}
 
+    # Operations callable through run(); anything else is rejected
+    _DISPATCH = {"store": store, "query": query, "clear": clear}
+
 async def run(module_run: Dict[str, Any]) -> Dict[str, Any]:
     """ Run the Knowledge Base Agent deployment """
 
     try:
-        module_run = AgentRunInput(**module_run)
-        module_run.inputs = InputSchema(**module_run.inputs)
+        module_run = AgentRunInput.model_validate(module_run)
+        module_run.inputs = InputSchema.model_validate(module_run.inputs)
         agent = KnowledgeBaseAgent(module_run.deployment, module_run.consumer_id)
-        await agent.market_kb.create(deployment=module_run.deployment.kb_deployments[0])
         
-        method = getattr(agent, module_run.inputs.func_name)
-        if not method:
+        method = agent._DISPATCH.get(module_run.inputs.func_name)
+        if method is None:
             raise ValueError(f"Invalid function name: {module_run.inputs.func_name}")
-            
-        result = await method(module_run)
-        return result
+
+        return await method(agent, module_run)
     except Exception as e:
         logger.error(f"Error running knowledge base agent: {str(e)}")
         return {"status": "error", "message": str(e)}
 
 if __name__ == "__main__":
-    import asyncio
-    import json
+    import sys
     from naptha_sdk.client.naptha import Naptha
     from naptha_sdk.configs import setup_module_deployment
 
     naptha = Naptha()
 
+    def write_section(lines):
+        """ Write a block of output lines in one call instead of a print per line """
+        sys.stdout.write("\n".join(lines) + "\n")
+
     # Testing code courtesy by OpenAI
     async def test_agent():
-        print("\n" + "="*80)
-        print("🧠 Testing Knowledge Base Agent".center(80))
-        print("="*80 + "\n")
+        write_section([
+            "\n" + "="*80,
+            "🧠 Testing Knowledge Base Agent".center(80),
+            "="*80 + "\n"
+        ])
 
         try:
             deployment = await setup_module_deployment(
                 "agent",
                 "knowledge_base_agent/configs/deployment.json",
-                node_url=os.getenv("NODE_URL")
+                node_url=NODE_URL
             )
         except Exception as e:
-            print("❌ Deployment Error:", str(e))
+            write_section([f"❌ Deployment Error: {str(e)}"])
             return
 
+        # The signature only depends on the consumer and key, so sign once for all runs
+        signature = sign_consumer_id(naptha.user.id, PRIVATE_KEY)
+
         # Example store operation
-        print("📝 Testing Knowledge Storage".center(80))
-        print("-"*80)
+        lines = [
+            "📝 Testing Knowledge Storage".center(80),
+            "-"*80
+        ]
         
         # Clean, single-line text without extra whitespace
         test_text = "Contrary to popular belief, Lorem Ipsum is not simply random text. It has roots in a piece of classical Latin literature from 45 BC, making it over 2000 years old. Richard McClintock, a Latin professor at Hampden-Sydney College in Virginia, looked up one of the more obscure Latin words, consectetur, from a Lorem Ipsum passage."
@@ -181,22 +542,25 @@ if __name__ == "__main__":
             },
             "deployment": deployment,
             "consumer_id": naptha.user.id,
-            "signature": sign_consumer_id(naptha.user.id, os.getenv("PRIVATE_KEY"))
+            "signature": signature
         }
 
         result = await run(store_input)
         if result.get("status") == "error":
             error_msg = result.get("error_message") or result.get("message") or "Unknown error occurred"
-            print("❌ Storage Error:", error_msg)
+            lines.append(f"❌ Storage Error: {error_msg}")
         else:
             knowledge_id = result.get("data", {}).get("id") or result.get("id")
-            print("✅ Successfully stored knowledge with ID:", knowledge_id or "N/A")
+            lines.append(f"✅ Successfully stored knowledge with ID: {knowledge_id or 'N/A'}")
         
-        print("\n" + "-"*80)
+        lines.append("\n" + "-"*80)
+        write_section(lines)
         
         # Example query operation
-        print("🔍 Testing Knowledge Query".center(80))
-        print("-"*80)
+        lines = [
+            "🔍 Testing Knowledge Query".center(80),
+            "-"*80
+        ]
         
         query_input = {
             "inputs": {
@@ -208,50 +572,60 @@ if __name__ == "__main__":
             },
             "deployment": deployment,
             "consumer_id": naptha.user.id,
-            "signature": sign_consumer_id(naptha.user.id, os.getenv("PRIVATE_KEY"))
+            "signature": signature
         }
 
         result = await run(query_input)
         if result.get("error"):
             error_msg = result.get("error_message") or "Unknown error occurred"
-            print("❌ Query Error:", error_msg)
+            lines.append(f"❌ Query Error: {error_msg}")
         else:
             try:
                 # Parse the JSON string from results array
                 if result.get("status") == "success":
                     data = json.loads(result.get('results')) if isinstance(result.get('results'), str) else result.get('results')
-                    print("✅ Found", len(data), "relevant results\n")
-                    
+                    lines.append(f"✅ Found {len(data)} relevant results\n")
+
                     for i, item in enumerate(data, 1):
-                        print(f"\n📎 Result {i}:")
-                        print("="*40)
+                        lines.append(f"\n📎 Result {i}:")
+                        lines.append("="*40)
                         
                         # Content
                         chunk = item.get("chunk", "").strip()
-                        print("📄 Content:".ljust(12), chunk[:200] + "..." if len(chunk) > 200 else chunk)
+                        lines.append("📄 Content:".ljust(12) + " " + (chunk[:200] + "..." if len(chunk) > 200 else chunk))
                         
                         # Metadata
                         metadata = item.get("metadata", {})
                         if metadata:
-                            print("\n🏷️  Metadata:")
+                            lines.append("\n🏷️  Metadata:")
                             for key, value in metadata.items():
-                                print(" "*12 + f"{key}: {value}")
+                                lines.append(" "*12 + f"{key}: {value}")
                         
                         # Source and Timestamp
-                        print("\n📚 Source:".ljust(12), item.get("source") or "Unknown")
-                        print("⌚ Time:".ljust(12), item.get("timestamp", "N/A"))
+                        lines.append("\n📚 Source:".ljust(12) + " " + str(item.get("source") or "Unknown"))
+                        lines.append("⌚ Time:".ljust(12) + " " + str(item.get("timestamp", "N/A")))
                         
                         if i < len(data):
-                            print("\n" + "-"*80)
+                            lines.append("\n" + "-"*80)
                 else:
-                    print("❌ Knowledge Base Error:", result.get("message", "Unknown error"))
+                    lines.append(f"❌ Knowledge Base Error: {result.get('message', 'Unknown error')}")
             except json.JSONDecodeError as e:
-                print("❌ Error parsing results:", str(e))
+                lines.append(f"❌ Error parsing results: {str(e)}")
             except Exception as e:
-                print("❌ Error processing results:", str(e))
+                lines.append(f"❌ Error processing results: {str(e)}")
+
+        await close_store_batchers()
 
-        print("\n" + "="*80)
-        print("✨ Test Complete".center(80))
-        print("="*80)
+        lines.extend([
+            "\n" + "="*80,
+            "✨ Test Complete".center(80),
+            "="*80
+        ])
+        write_section(lines)
+
+    try:
+        from uvloop import run as run_event_loop
+    except ImportError:  # uvloop is not available on Windows
+        run_event_loop = asyncio.run
 
-    asyncio.run(test_agent())
\ No newline at end of file
+    run_event_loop(test_agent())
\ No newline at end of file
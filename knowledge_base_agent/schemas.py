@@ -1,19 +1,27 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Dict, Any, Optional, List
 
 class InputSchema(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     func_name: str
     func_input_data: Optional[Dict[str, Any]] = None
 
 class QueryInput(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     query: str
     top_k: int = 2
 
 class StoreInput(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     content: str
-    metadata: Dict[str, Any] = {}
+    metadata: Dict[str, Any] = Field(default_factory=dict)
 
 class KnowledgeResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     chunk: str
     chunk_start: int
     chunk_end: int
@@ -24,5 +32,7 @@ class KnowledgeResponse(BaseModel):
     similarity: float
 
 class QueryResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     status: str
     data: List[KnowledgeResponse]
@@ -0,0 +1,28 @@
+import json
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from knowledge_base_agent.run import extract_search_data
+
+def search_response(data) -> str:
+    return json.dumps({"results": [json.dumps({"data": data})]})
+
+@pytest.mark.parametrize("data", [
+    [{"chunk": "Lorem ipsum", "metadata": {"source": "Café"}}],
+    {"chunk": "Lorem ipsum"},
+    "Lorem ipsum",
+    42,
+    True
+])
+def test_data_round_trips(data):
+    assert json.loads(extract_search_data(search_response(data))) == data
+
+@pytest.mark.parametrize("data", [[], {}, "", 0, None])
+def test_empty_data_is_an_empty_string(data):
+    assert extract_search_data(search_response(data)) == ""
+
+def test_threads_parse_concurrently():
+    responses = [search_response([{"chunk": str(i)}]) for i in range(200)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        extracted = list(pool.map(extract_search_data, responses))
+
+    assert [json.loads(data)[0]["chunk"] for data in extracted] == [str(i) for i in range(200)]
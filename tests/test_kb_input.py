@@ -0,0 +1,65 @@
+import asyncio
+from types import SimpleNamespace
+from naptha_sdk.schemas import KBDeployment
+from knowledge_base_agent import run as kb_run
+from knowledge_base_agent.run import KnowledgeBaseAgent
+
+class FakeKnowledgeBase:
+    def __init__(self):
+        self.created = 0
+
+    async def create(self, deployment):
+        await asyncio.sleep(0.01)
+        self.created += 1
+
+def make_agent(monkeypatch, node_ip: str) -> KnowledgeBaseAgent:
+    monkeypatch.setattr(kb_run, "KnowledgeBase", FakeKnowledgeBase)
+    kb_deployment = KBDeployment(node={"ip": node_ip}, name="market_kb_deployment")
+    return KnowledgeBaseAgent(SimpleNamespace(kb_deployments=[kb_deployment]), "consumer")
+
+def test_kb_input_uses_the_runs_own_deployment(monkeypatch):
+    monkeypatch.setattr(kb_run, "_kb_clients", {})
+
+    first = make_agent(monkeypatch, "10.0.0.1")
+    second = make_agent(monkeypatch, "10.0.0.2")
+    first._create_kb_input(func_name="search", signature="sig-1", func_input_data={"query": "q"})
+    kb_input = second._create_kb_input(func_name="clear", signature="sig-2")
+
+    assert kb_input.deployment is second.deployment.kb_deployments[0]
+    assert kb_input.deployment.node.ip == "10.0.0.2"
+    assert kb_input.inputs == {"func_name": "clear", "func_input_data": None}
+    assert kb_input.signature == "sig-2"
+    assert kb_input.orchestrator_runs == []
+
+def test_same_name_on_another_node_gets_its_own_client(monkeypatch):
+    monkeypatch.setattr(kb_run, "_kb_clients", {})
+
+    first = make_agent(monkeypatch, "10.0.0.1")
+    again = make_agent(monkeypatch, "10.0.0.1")
+    other = make_agent(monkeypatch, "10.0.0.2")
+
+    assert first.market_kb is again.market_kb
+    assert first.market_kb is not other.market_kb
+
+def test_create_runs_once_per_deployment_across_event_loops(monkeypatch):
+    monkeypatch.setattr(kb_run, "_kb_clients", {})
+    monkeypatch.setattr(kb_run, "_kb_created", set())
+
+    async def create_concurrently(agents):
+        await asyncio.gather(*(agent._ensure_created() for agent in agents))
+
+    # Contend on the create lock under one loop, then under another
+    first = [make_agent(monkeypatch, "10.0.0.1") for _ in range(3)]
+    asyncio.run(create_concurrently(first))
+    second = [make_agent(monkeypatch, "10.0.0.2") for _ in range(3)]
+    asyncio.run(create_concurrently(second))
+
+    assert first[0].market_kb.created == 1
+    assert second[0].market_kb.created == 1
+
+def test_deployment_key_reads_dict_and_model_nodes():
+    model_node = KBDeployment(node={"ip": "10.0.0.1", "http_port": 7001}, name="market_kb_deployment")
+    dict_node = KBDeployment.model_construct(node={"ip": "10.0.0.1", "http_port": 7001}, name="market_kb_deployment")
+
+    assert kb_run.kb_deployment_key(model_node) == kb_run.kb_deployment_key(dict_node)
+    assert kb_run.kb_deployment_key(model_node) != kb_run.kb_deployment_key(model_node.model_copy(update={"name": "other"}))
@@ -0,0 +1,65 @@
+from knowledge_base_agent import run as kb_run
+from knowledge_base_agent.run import QueryCache
+
+RESULT = {"status": "success", "results": "[]"}
+
+def test_miss_then_hit():
+    cache = QueryCache()
+    key = cache.make_key("kb", "what is lorem ipsum?", 2, "consumer")
+
+    assert cache.get(key) is None
+    cache.set(key, RESULT, cache.generation)
+    assert cache.get(key) == RESULT
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_key_includes_kb_deployment():
+    assert QueryCache.make_key("kbA", "q", 2, "consumer") != QueryCache.make_key("kbB", "q", 2, "consumer")
+
+def test_hit_returns_a_copy():
+    cache = QueryCache()
+    value = {"status": "success", "results": []}
+    cache.set("key", value, cache.generation)
+    value["results"].append("set by caller")
+
+    hit = cache.get("key")
+    hit["status"] = "mutated"
+    hit["results"].append("mutated")
+    assert cache.get("key") == {"status": "success", "results": []}
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(kb_run.time, "monotonic", lambda: now[0])
+    cache = QueryCache(ttl=300)
+    cache.set("key", RESULT, cache.generation)
+
+    now[0] += 299
+    assert cache.get("key") == RESULT
+    now[0] += 2
+    assert cache.get("key") is None
+    assert "key" not in cache._entries
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryCache(maxsize=2)
+    cache.set("a", RESULT, cache.generation)
+    cache.set("b", RESULT, cache.generation)
+    cache.get("a")
+    cache.set("c", RESULT, cache.generation)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == RESULT
+    assert cache.get("c") == RESULT
+
+def test_clear_drops_entries_and_stale_sets():
+    cache = QueryCache()
+    cache.set("key", RESULT, cache.generation)
+    generation = cache.generation
+
+    cache.clear()
+    assert cache.get("key") is None
+
+    # A query that started before the clear must not repopulate the cache
+    cache.set("key", RESULT, generation)
+    assert cache.get("key") is None
+
+    cache.set("key", RESULT, cache.generation)
+    assert cache.get("key") == RESULT
@@ -0,0 +1,168 @@
+import asyncio
+import time
+import pytest
+from knowledge_base_agent.run import StoreBatcher
+from knowledge_base_agent.schemas import StoreInput
+
+class FakeRun:
+    def __init__(self, data):
+        self.data = data
+
+    def model_dump(self, **kwargs):
+        return {"id": "run-1", "inputs": {"items": "..."}, **self.data}
+
+class FakeKnowledgeBase:
+    """ Records KB calls and answers ingest_knowledge_batch according to `batch_mode` """
+
+    def __init__(self, batch_mode: str = "per_item"):
+        self.batch_mode = batch_mode
+        self.calls = []
+
+    async def run(self, kb_run_input):
+        func_name = kb_run_input["func_name"]
+        data = kb_run_input["func_input_data"]
+        self.calls.append(func_name)
+
+        if func_name == "ingest_knowledge":
+            return FakeRun({"status": "completed", "results": [data["content"]]})
+        if self.batch_mode == "raise":
+            raise RuntimeError("node unreachable")
+        if self.batch_mode == "unknown_function":
+            return FakeRun({"status": "error", "error": True, "error_message": "Invalid function name: ingest_knowledge_batch"})
+        if self.batch_mode == "error":
+            return FakeRun({"status": "error", "error": True, "error_message": "Write timed out"})
+        if self.batch_mode == "single_result":
+            return FakeRun({"status": "completed", "results": ["ok"]})
+        return FakeRun({"status": "completed", "results": [item["content"] for item in data["items"]]})
+
+def create_kb_input(**kwargs):
+    return kwargs
+
+def store_all(batcher, contents):
+    return asyncio.gather(*(batcher.submit(StoreInput(content=content), "sig") for content in contents))
+
+def test_lone_store_is_sent_without_waiting_for_a_batch():
+    async def scenario():
+        market_kb = FakeKnowledgeBase()
+        batcher = StoreBatcher(market_kb, create_kb_input, max_delay_ms=1000)
+
+        started = time.monotonic()
+        result = await batcher.submit(StoreInput(content="a"), "sig")
+
+        assert time.monotonic() - started < 0.5
+        assert result["results"] == ["a"]
+        assert market_kb.calls == ["ingest_knowledge"]
+        await batcher.close()
+
+    asyncio.run(scenario())
+
+def test_concurrent_stores_share_one_batch_call():
+    async def scenario():
+        market_kb = FakeKnowledgeBase()
+        batcher = StoreBatcher(market_kb, create_kb_input)
+
+        results = await store_all(batcher, ["a", "b", "c"])
+
+        assert market_kb.calls == ["ingest_knowledge_batch"]
+        assert [result["results"] for result in results] == [["a"], ["b"], ["c"]]
+        # The batch run's id and inputs cover every store, so no caller gets them
+        assert all("id" not in result and "inputs" not in result for result in results)
+        await batcher.close()
+
+    asyncio.run(scenario())
+
+def test_batches_are_capped_at_max_batch():
+    async def scenario():
+        market_kb = FakeKnowledgeBase()
+        batcher = StoreBatcher(market_kb, create_kb_input, max_batch=2)
+
+        results = await store_all(batcher, ["a", "b", "c", "d"])
+
+        assert market_kb.calls == ["ingest_knowledge_batch", "ingest_knowledge_batch"]
+        assert [result["results"] for result in results] == [["a"], ["b"], ["c"], ["d"]]
+        await batcher.close()
+
+    asyncio.run(scenario())
+
+def test_unknown_batch_function_falls_back_to_per_item_ingest():
+    async def scenario():
+        market_kb = FakeKnowledgeBase("unknown_function")
+        batcher = StoreBatcher(market_kb, create_kb_input)
+
+        results = await store_all(batcher, ["a", "b"])
+        assert [result["results"] for result in results] == [["a"], ["b"]]
+        assert market_kb.calls == ["ingest_knowledge_batch", "ingest_knowledge", "ingest_knowledge"]
+
+        # Once the KB has said it doesn't know the batch call, later stores skip it
+        await store_all(batcher, ["c", "d"])
+        assert market_kb.calls[3:] == ["ingest_knowledge", "ingest_knowledge"]
+        await batcher.close()
+
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize("batch_mode", ["raise", "error"])
+def test_failed_batch_is_not_replayed(batch_mode):
+    async def scenario():
+        market_kb = FakeKnowledgeBase(batch_mode)
+        batcher = StoreBatcher(market_kb, create_kb_input)
+
+        results = await asyncio.gather(
+            *(batcher.submit(StoreInput(content=content), "sig") for content in ["a", "b"]),
+            return_exceptions=True
+        )
+        assert all(isinstance(result, Exception) for result in results)
+        assert market_kb.calls == ["ingest_knowledge_batch"]
+
+        # A failed call doesn't turn batching off
+        market_kb.batch_mode = "per_item"
+        await store_all(batcher, ["c", "d"])
+        assert market_kb.calls[1:] == ["ingest_knowledge_batch"]
+        await batcher.close()
+
+    asyncio.run(scenario())
+
+def test_batch_without_per_item_results_stops_batching():
+    async def scenario():
+        market_kb = FakeKnowledgeBase("single_result")
+        batcher = StoreBatcher(market_kb, create_kb_input)
+
+        results = await store_all(batcher, ["a", "b"])
+        assert results == [{"status": "completed"}, {"status": "completed"}]
+        assert not batcher.batch_supported
+
+        await store_all(batcher, ["c", "d"])
+        assert market_kb.calls == ["ingest_knowledge_batch", "ingest_knowledge", "ingest_knowledge"]
+        await batcher.close()
+
+    asyncio.run(scenario())
+
+def test_close_stops_the_worker_and_fails_waiting_stores():
+    async def scenario():
+        batcher = StoreBatcher(FakeKnowledgeBase(), create_kb_input)
+        await batcher.close()
+        assert not batcher.alive
+
+        future = asyncio.get_running_loop().create_future()
+        batcher._queue.put_nowait((StoreInput(content="a"), "sig", future))
+        await batcher.close()
+        with pytest.raises(RuntimeError):
+            future.result()
+
+    asyncio.run(scenario())
+
+def test_idle_worker_exits_and_reports_it():
+    async def scenario():
+        exited = []
+        batcher = StoreBatcher(FakeKnowledgeBase(), create_kb_input, idle_timeout=0.05, on_exit=lambda: exited.append(True))
+
+        result = await batcher.submit(StoreInput(content="a"), "sig")
+        assert result["results"] == ["a"]
+        assert batcher.alive
+
+        await asyncio.sleep(0.2)
+        assert not batcher.alive
+        assert exited == [True]
+        with pytest.raises(RuntimeError):
+            await batcher.submit(StoreInput(content="b"), "sig")
+
+    asyncio.run(scenario())